@@ -11,6 +11,39 @@ logger = get_logger(__name__)
 # Initialize Local LLM (DeepSeek R1 via Ollama)
 llm = ChatOllama(model="deepseek-r1:8b")
 
+# Spoken when the LLM can't be reached
+ERROR_RESPONSE = "I APOLOGIZE, BUT I AM HAVING TROUBLE THINKING RIGHT NOW."
+
+def build_prompt_messages(text: str, past_context: str = "") -> list:
+    """Build the system + human prompt, including any prior conversation history."""
+    # Construct system prompt with history
+    system_content = (
+        "You are a helpful voice assistant. Keep your responses concise and conversational. "
+        "IMPORTANT: You must format your final response entirely in UPPERCASE letters. "
+        "Use clear sentence boundaries."
+    )
+    if past_context:
+        system_content += f"\n\nPrevious conversation history:\n{past_context}"
+    
+    return [SystemMessage(content=system_content), HumanMessage(content=text)]
+
+def clean_response(raw_content: str) -> tuple:
+    """Split DeepSeek R1 output into (spoken content, thinking), dropping emojis."""
+    agent_thinking = ""
+    
+    # Extract thinking
+    think_match = re.search(r'<think>(.*?)</think>', raw_content, flags=re.DOTALL)
+    if think_match:
+        agent_thinking = think_match.group(1).strip()
+    
+    # Filter out <think>...</think> tags from DeepSeek R1
+    content = re.sub(r'<think>.*?</think>', '', raw_content, flags=re.DOTALL).strip()
+    
+    # Remove emojis
+    content = emoji.replace_emoji(content, replace='')
+    
+    return content, agent_thinking
+
 def process_input(state: AgentState) -> AgentState:
     """Node to process text input and generate a textual response."""
     text = state.get("input_text", "")
@@ -24,26 +57,15 @@ def process_input(state: AgentState) -> AgentState:
     if session_id:
         past_context = get_cumulative_context(session_id)
     
-    # Construct system prompt with history
-    system_content = (
-        "You are a helpful voice assistant. Keep your responses concise and conversational. "
-        "IMPORTANT: You must format your final response entirely in UPPERCASE letters. "
-        "Use clear sentence boundaries."
-    )
-    if past_context:
-        system_content += f"\n\nPrevious conversation history:\n{past_context}"
-    
-    system_message = SystemMessage(content=system_content)
-    human_msg = HumanMessage(content=text)
-    
-    prompt_messages = [system_message, human_msg]
+    prompt_messages = build_prompt_messages(text, past_context)
+    human_msg = prompt_messages[-1]
     
     # Invoke the local LLM
     try:
         response = llm.invoke(prompt_messages)
     except Exception as e:
         logger.error(f"LLM invocation failed: {e}")
-        error_msg = "I APOLOGIZE, BUT I AM HAVING TROUBLE THINKING RIGHT NOW."
+        error_msg = ERROR_RESPONSE
         return {
             "response_text": error_msg,
             "messages": [human_msg, AIMessage(content=error_msg)],
@@ -51,19 +73,7 @@ def process_input(state: AgentState) -> AgentState:
             "cumilative_context": past_context
         }
     
-    # Filter out <think>...</think> tags from DeepSeek R1
-    raw_content = response.content
-    agent_thinking = ""
-    
-    # Extract thinking
-    think_match = re.search(r'<think>(.*?)</think>', raw_content, flags=re.DOTALL)
-    if think_match:
-        agent_thinking = think_match.group(1).strip()
-    
-    content = re.sub(r'<think>.*?</think>', '', raw_content, flags=re.DOTALL).strip()
-    
-    # Remove emojis
-    content = emoji.replace_emoji(content, replace='')
+    content, agent_thinking = clean_response(response.content)
     
     # Update the response content with cleaned text
     response.content = content
@@ -2,11 +2,14 @@ import shutil
 import os
 import uuid
 from pathlib import Path
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from app.workflows.graph import app_graph
+from app.workflows.session import VoiceSession
 from app.models.schemas import TextRequest
-from app.core.logging import get_logger
+from app.core.logging import get_logger, set_request_id
 from app.core.config import INPUT_AUDIO_DIR
 
 logger = get_logger(__name__)
@@ -31,7 +34,8 @@ async def chat_text(request: TextRequest):
     
     # Run the graph
     try:
-        final_state = app_graph.invoke(initial_state, config=config)
+        # Run off the event loop so open /chat/stream sessions keep flowing
+        final_state = await run_in_threadpool(app_graph.invoke, initial_state, config=config)
     except Exception as e:
         logger.error(f"Graph invocation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -75,7 +79,8 @@ async def chat_voice(
     
     # Run the graph
     try:
-        final_state = app_graph.invoke(initial_state, config=config)
+        # Run off the event loop so open /chat/stream sessions keep flowing
+        final_state = await run_in_threadpool(app_graph.invoke, initial_state, config=config)
     except Exception as e:
         logger.error(f"Graph invocation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -90,3 +95,18 @@ async def chat_voice(
     headers = {"X-Session-ID": session_id}
     return FileResponse(audio_path, media_type="audio/wav", filename="response.wav", headers=headers)
 
+@router.websocket("/chat/stream")
+async def chat_stream(websocket: WebSocket, session_id: Optional[str] = None):
+    """
+    Full-duplex voice session: stream microphone PCM in, synthesized PCM out.
+    The session stays open across turns and supports barge-in.
+    """
+    await websocket.accept()
+    session_id = session_id or str(uuid.uuid4())
+    # HTTP middleware doesn't run for WebSockets; log the whole stream under its session
+    set_request_id(session_id)
+    
+    try:
+        await VoiceSession(websocket, session_id).run()
+    except WebSocketDisconnect:
+        logger.info(f"Client disconnected from session {session_id}")
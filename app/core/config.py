@@ -20,3 +20,23 @@ INPUT_AUDIO_DIR.mkdir(exist_ok=True)
 GENERATED_AUDIO_DIR.mkdir(exist_ok=True)
 LOGS_DIR.mkdir(exist_ok=True)
 
+
+# Streaming voice session (WebSocket)
+# Incoming microphone audio: raw 16-bit little-endian mono PCM at this rate
+STREAM_SAMPLE_RATE = 16000
+# RMS level (0-1 float scale) above which a frame counts as speech
+STREAM_VAD_THRESHOLD = float(os.getenv("STREAM_VAD_THRESHOLD", "0.02"))
+# Trailing silence that closes an utterance
+STREAM_SILENCE_MS = int(os.getenv("STREAM_SILENCE_MS", "700"))
+# Utterances shorter than this are treated as noise and dropped
+STREAM_MIN_SPEECH_MS = int(os.getenv("STREAM_MIN_SPEECH_MS", "250"))
+
+# Logging
+# Format and write log records on a background thread (QueueHandler/QueueListener)
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+# Emit one JSON object per line instead of plain text
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+# Truncate AGENT_OUTPUT messages longer than this (0 disables truncation)
+LOG_AGENT_OUTPUT_MAX_CHARS = int(os.getenv("LOG_AGENT_OUTPUT_MAX_CHARS", "2000"))
+# Fraction of AGENT_OUTPUT records to keep (1.0 keeps all)
+LOG_AGENT_OUTPUT_SAMPLE_RATE = float(os.getenv("LOG_AGENT_OUTPUT_SAMPLE_RATE", "1.0"))
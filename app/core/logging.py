@@ -1,7 +1,21 @@
+import atexit
+import copy
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from app.core.config import LOGS_DIR
+import queue
+import random
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from app.core.config import (
+    LOGS_DIR,
+    LOG_ASYNC,
+    LOG_JSON,
+    LOG_AGENT_OUTPUT_MAX_CHARS,
+    LOG_AGENT_OUTPUT_SAMPLE_RATE,
+)
 
 # Custom Log Level
 AGENT_OUTPUT_LEVEL = 25
@@ -13,15 +27,118 @@ def agent_output(self, message, *args, **kws):
 
 logging.Logger.agent_output = agent_output
 
-def setup_logger():
-    """Sets up the comprehensive logging system."""
-    log_dir = LOGS_DIR
-    
+# Request ID of the current request/session, attached to every record logged under it
+request_id_var = ContextVar("request_id", default=None)
+
+# Background listener when queue-based logging is enabled
+_listener = None
+
+def set_request_id(request_id):
+    """Tag all records logged from the current context with `request_id`."""
+    return request_id_var.set(request_id)
+
+class RequestIdFilter(logging.Filter):
+    """Copies the request ID onto the record while still on the logging thread."""
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class AgentOutputLimiter(logging.Filter):
+    """Samples and truncates AGENT_OUTPUT records, which carry full user inputs and agent responses."""
+    def __init__(self, max_chars=0, sample_rate=1.0):
+        super().__init__()
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if record.levelno != AGENT_OUTPUT_LEVEL:
+            return True
+        # In sync mode every handler runs this filter; decide once per record
+        keep = getattr(record, "agent_output_kept", None)
+        if keep is not None:
+            return keep
+
+        keep = self.sample_rate >= 1.0 or self._sample_point() < self.sample_rate
+        if keep and self.max_chars:
+            message = record.getMessage()
+            if len(message) > self.max_chars:
+                record.msg = f"{message[:self.max_chars]}... [truncated {len(message) - self.max_chars} chars]"
+                record.args = None
+        record.agent_output_kept = keep
+        return keep
+
+    @staticmethod
+    def _sample_point():
+        # Hash the request ID so a request's input and response lines are kept or dropped together
+        request_id = request_id_var.get()
+        if request_id is None:
+            return random.random()
+        return zlib.crc32(str(request_id).encode()) / 2**32
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps the traceback in `exc_text` instead of merging it
+    into the message, so queued records format the same as synchronous ones.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # Merge args now; they may not survive the trip to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+    def format(self, record):
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+def setup_logger(
+    log_dir=None,
+    use_queue=None,
+    json_format=None,
+    agent_output_max_chars=None,
+    agent_output_sample_rate=None,
+    console=True
+):
+    """
+    Sets up the comprehensive logging system.
+
+    Options default to the LOG_* settings in config. With `use_queue` the root
+    logger only enqueues records; formatting, file writes and rotation happen
+    on a QueueListener thread.
+    """
+    global _listener
+    log_dir = log_dir or LOGS_DIR
+    use_queue = LOG_ASYNC if use_queue is None else use_queue
+    json_format = LOG_JSON if json_format is None else json_format
+    if agent_output_max_chars is None:
+        agent_output_max_chars = LOG_AGENT_OUTPUT_MAX_CHARS
+    if agent_output_sample_rate is None:
+        agent_output_sample_rate = LOG_AGENT_OUTPUT_SAMPLE_RATE
+
     # Create formatters
-    detailed_formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
-    simple_formatter = logging.Formatter("%(asctime)s - %(message)s")
+    if json_format:
+        detailed_formatter = simple_formatter = JsonFormatter()
+    else:
+        detailed_formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
+        simple_formatter = logging.Formatter("%(asctime)s - %(message)s")
 
     # 1. All Logs (DEBUG and above)
     all_handler = RotatingFileHandler(log_dir / "all.log", maxBytes=10*1024*1024, backupCount=5)
@@ -32,7 +149,7 @@ def setup_logger():
     warnings_handler = RotatingFileHandler(log_dir / "warnings.log", maxBytes=5*1024*1024, backupCount=3)
     warnings_handler.setLevel(logging.WARNING)
     warnings_handler.setFormatter(detailed_formatter)
-    
+
     # 3. Errors (ERROR and above)
     errors_handler = RotatingFileHandler(log_dir / "errors.log", maxBytes=5*1024*1024, backupCount=3)
     errors_handler.setLevel(logging.ERROR)
@@ -42,7 +159,7 @@ def setup_logger():
     agent_handler = RotatingFileHandler(log_dir / "agent_outputs.log", maxBytes=5*1024*1024, backupCount=5)
     agent_handler.setLevel(AGENT_OUTPUT_LEVEL)
     agent_handler.setFormatter(simple_formatter)
-    
+
     # Filter to ensure ONLY AGENT_OUTPUT level goes here
     class AgentOutputFilter(logging.Filter):
         def filter(self, record):
@@ -50,27 +167,56 @@ def setup_logger():
 
     agent_handler.addFilter(AgentOutputFilter())
 
+    handlers = [all_handler, warnings_handler, errors_handler, agent_handler]
+
+    # Add console handler too for dev visibility
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(detailed_formatter)
+        handlers.append(console_handler)
+
     # Get root logger
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)  # Capture everything at root level
-    
-    # Clear existing handlers to avoid duplicates during reload
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
-    # Add handlers
-    logger.addHandler(all_handler)
-    logger.addHandler(warnings_handler)
-    logger.addHandler(errors_handler)
-    logger.addHandler(agent_handler)
-    
-    # Add console handler too for dev visibility
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(detailed_formatter)
-    logger.addHandler(console_handler)
+
+    # Close and clear existing handlers to avoid duplicates during reload
+    shutdown_logger()
+
+    # Request-thread handlers: the QueueHandler alone, or every handler in sync mode.
+    # Filters run here so request IDs come from the caller's context and oversized
+    # agent outputs are trimmed before they are queued.
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        front_handlers = [StructuredQueueHandler(log_queue)]
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        front_handlers = handlers
+
+    for handler in front_handlers:
+        handler.addFilter(RequestIdFilter())
+        handler.addFilter(AgentOutputLimiter(agent_output_max_chars, agent_output_sample_rate))
+        logger.addHandler(handler)
 
     logging.info("Logging system initialized.")
 
+def shutdown_logger():
+    """Flush queued records, stop the background listener and close every root handler."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+    # Release the log files (sync mode handlers or the QueueHandler)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+atexit.register(shutdown_logger)
+
 def get_logger(name):
     return logging.getLogger(name)
@@ -1,6 +1,7 @@
-from fastapi import FastAPI
+import uuid
+from fastapi import FastAPI, Request
 from app.api.routes import router
-from app.core.logging import setup_logger, get_logger
+from app.core.logging import setup_logger, get_logger, set_request_id
 
 # Setup Logging
 setup_logger()
@@ -9,9 +10,18 @@ logger = get_logger(__name__)
 app = FastAPI(title="Voice Agent API")
 logger.info("FastAPI app initialized.")
 
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Tag every log record of a request with its ID and echo it back to the client."""
+    request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+    set_request_id(request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Include Routes
 app.include_router(router)
 
 @app.get("/")
 def read_root():
-    return {"message": "Voice Agent API is running. Use /chat/text or /chat/voice."}
+    return {"message": "Voice Agent API is running. Use /chat/text, /chat/voice or the /chat/stream WebSocket."}
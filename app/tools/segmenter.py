@@ -4,13 +4,8 @@ from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
-def segment_text(state: AgentState) -> AgentState:
-    """Node to split the agent's text response into smaller chunks for TTS."""
-    text = state.get("response_text", "")
-    
-    if not text:
-        return {"response_segments": []}
-        
+def split_segments(text: str) -> list:
+    """Split text into sentence-sized chunks of at most ~200 characters for TTS."""
     # Split by common sentence terminators but keep them
     # distinct sentences usually end with . ? ! followed by space or newline
     # Simple regex split
@@ -40,7 +35,17 @@ def segment_text(state: AgentState) -> AgentState:
                     current_chunk = part + " "
             if current_chunk:
                 final_segments.append(current_chunk.strip())
-                
+    
+    return final_segments
+
+def segment_text(state: AgentState) -> AgentState:
+    """Node to split the agent's text response into smaller chunks for TTS."""
+    text = state.get("response_text", "")
+    
+    if not text:
+        return {"response_segments": []}
+    
+    final_segments = split_segments(text)
     logger.info(f"Segmented text into {len(final_segments)} chunks.")
     return {"response_segments": final_segments}
 
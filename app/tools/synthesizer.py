@@ -1,4 +1,5 @@
 import uuid
+import threading
 import soundfile as sf
 import numpy as np
 from pathlib import Path
@@ -17,6 +18,23 @@ except TypeError:
     tts = ChatterboxTTS.from_pretrained()
 print("Chatterbox TTS model loaded.")
 
+# The model is not safe to run concurrently (HTTP graph runs and streamed turns share it)
+tts_lock = threading.RLock()
+
+def generate_segment_audio(seg: str) -> np.ndarray:
+    """Synthesize a single text segment into a mono float32 array at `tts.sr`."""
+    # Pad input to prevent truncation
+    padded_seg = f" {seg} " 
+    with tts_lock:
+        audio = tts.generate(padded_seg)
+    
+    if hasattr(audio, "numpy"):
+        audio = audio.squeeze().numpy()
+    elif hasattr(audio, "detach"): # torch tensor
+        audio = audio.detach().cpu().squeeze().numpy()
+    
+    return audio
+
 def synthesize_audio(state: AgentState) -> AgentState:
     """Node to convert text segments to audio using Chatterbox TTS (Local) and concatenate them."""
     segments = state.get("response_segments", [])
@@ -35,18 +53,9 @@ def synthesize_audio(state: AgentState) -> AgentState:
     audio_arrays = []
     
     for i, seg in enumerate(segments):
-        # Pad input to prevent truncation
-        padded_seg = f" {seg} " 
-        
         try:
             # Generate audio for the chunk
-            audio = tts.generate(padded_seg)
-            
-            if hasattr(audio, "numpy"):
-                audio = audio.squeeze().numpy()
-            elif hasattr(audio, "detach"): # torch tensor
-                audio = audio.detach().cpu().squeeze().numpy()
-                
+            audio = generate_segment_audio(seg)
             audio_arrays.append(audio)
             
             # Add silence between chunks (200ms)
@@ -1,4 +1,6 @@
 import os
+import threading
+import numpy as np
 from faster_whisper import WhisperModel
 from app.workflows.state import AgentState
 from app.core.logging import get_logger
@@ -11,6 +13,16 @@ print("Loading Faster Whisper model...")
 stt_model = WhisperModel("base", device="cpu", compute_type="int8")
 print("Faster Whisper model loaded.")
 
+# Serialize model access across HTTP graph runs and streamed turns
+stt_lock = threading.RLock()
+
+def transcribe_array(audio: np.ndarray) -> str:
+    """Transcribe mono float32 PCM sampled at 16 kHz without touching the filesystem."""
+    with stt_lock:
+        # Segments are decoded lazily, so consume them while holding the lock
+        segments, info = stt_model.transcribe(audio, beam_size=5)
+        return "".join([segment.text for segment in segments])
+
 def transcribe_audio(state: AgentState) -> AgentState:
     """Node to transcribe audio to text using Faster Whisper (Local)."""
     try:
@@ -21,10 +33,11 @@ def transcribe_audio(state: AgentState) -> AgentState:
             return {}
         
         # Run transcription
-        segments, info = stt_model.transcribe(audio_path, beam_size=5)
-        
-        # Combine segments into full text
-        transcription_text = "".join([segment.text for segment in segments])
+        with stt_lock:
+            segments, info = stt_model.transcribe(audio_path, beam_size=5)
+            
+            # Combine segments into full text
+            transcription_text = "".join([segment.text for segment in segments])
         
         return {"input_text": transcription_text}
     except Exception as e:
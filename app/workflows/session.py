@@ -0,0 +1,367 @@
+import re
+import json
+import asyncio
+import threading
+from typing import Optional
+import emoji
+import numpy as np
+from fastapi import WebSocket
+from app.core.logging import get_logger
+from app.core.config import (
+    STREAM_SAMPLE_RATE,
+    STREAM_VAD_THRESHOLD,
+    STREAM_SILENCE_MS,
+    STREAM_MIN_SPEECH_MS,
+)
+from app.agents.assistant import llm, ERROR_RESPONSE, build_prompt_messages, clean_response
+from app.tools.transcriber import stt_lock, transcribe_array
+from app.tools.segmenter import split_segments
+from app.tools.synthesizer import tts, tts_lock, generate_segment_audio
+from app.db.storage import get_cumulative_context, save_interaction
+
+logger = get_logger(__name__)
+
+# A sentence is complete once its terminator is followed by whitespace
+SENTENCE_END = re.compile(r'[.!?]\s+')
+
+
+def visible_text(raw: str) -> str:
+    """Return the speakable part of a partial DeepSeek R1 stream (no <think> blocks or emojis)."""
+    text = re.sub(r'<think>.*?</think>', '', raw, flags=re.DOTALL)
+
+    # Hold back an unfinished thinking block
+    open_idx = text.find('<think>')
+    if open_idx != -1:
+        text = text[:open_idx]
+
+    # Hold back a tag that is still arriving, e.g. "<thi"
+    lt_idx = text.rfind('<')
+    if lt_idx != -1 and '<think>'.startswith(text[lt_idx:]):
+        text = text[:lt_idx]
+
+    return emoji.replace_emoji(text.lstrip(), replace='')
+
+
+class VoiceSession:
+    """
+    A full-duplex voice conversation over a single WebSocket.
+
+    Microphone audio arrives as binary frames of 16-bit mono PCM at
+    STREAM_SAMPLE_RATE. An energy based VAD splits it into utterances; each
+    utterance starts a turn that transcribes, streams the LLM reply sentence
+    by sentence into a TTS queue and sends the audio back as soon as each
+    sentence is synthesized. Speech detected while a turn is running cancels
+    it (barge-in). Conversation context is kept in memory between turns and
+    persisted to SQLite in the background (without a per-turn summary).
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: str):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.context = ""
+
+        self._send_lock = asyncio.Lock()
+        self._save_lock = asyncio.Lock()
+        self._turn: Optional[asyncio.Task] = None
+        self._background = set()
+
+        # Loop time at which the client should finish playing the audio sent so far
+        self._playback_end = 0.0
+
+        # Utterance / VAD state
+        self._speech = []
+        self._last_frame = None
+        self._in_speech = False
+        self._barged_in = False
+        self._speech_samples = 0
+        self._silence_samples = 0
+        self._silence_limit = STREAM_SAMPLE_RATE * STREAM_SILENCE_MS // 1000
+        self._min_speech = STREAM_SAMPLE_RATE * STREAM_MIN_SPEECH_MS // 1000
+
+    async def run(self):
+        """Serve the session until the client disconnects."""
+        # Load persisted history once; later turns reuse the in-memory copy
+        self.context = await asyncio.to_thread(get_cumulative_context, self.session_id)
+
+        await self._send_json({
+            "type": "session",
+            "session_id": self.session_id,
+            "input_sample_rate": STREAM_SAMPLE_RATE,
+            "output_sample_rate": tts.sr,
+        })
+        logger.info(f"Voice stream opened for session {self.session_id}")
+
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    await self._on_audio(message["bytes"])
+                elif message.get("text") is not None:
+                    await self._on_control(message["text"])
+        finally:
+            await self.cancel_turn()
+            logger.info(f"Voice stream closed for session {self.session_id}")
+
+    async def cancel_turn(self, notify: bool = False):
+        """
+        Cancel the in-flight turn (LLM stream and TTS queue), if any.
+
+        With `notify`, the client is told to stop playback whenever the agent is
+        still talking: while the turn runs, and also after it has sent its last
+        audio but the client is probably still playing it.
+        """
+        task = self._turn
+        self._turn = None
+        running = task is not None and not task.done()
+
+        if running:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            logger.info(f"Turn interrupted for session {self.session_id}")
+
+        playing = self._playback_time() < self._playback_end
+        self._playback_end = 0.0
+        if notify and (running or playing):
+            await self._send_json({"type": "interrupted"})
+
+    # --- Input handling ---
+
+    async def _on_control(self, raw: str):
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            await self._send_json({"type": "error", "detail": "Invalid control message."})
+            return
+
+        kind = message.get("type")
+        if kind == "end_of_speech":
+            await self._end_utterance()
+        elif kind == "interrupt":
+            await self.cancel_turn(notify=True)
+        elif kind == "text" and message.get("text"):
+            await self._start_turn(self._respond(message["text"]))
+        else:
+            await self._send_json({"type": "error", "detail": f"Unknown message type: {kind}"})
+
+    async def _on_audio(self, data: bytes):
+        # Drop a dangling byte rather than failing on a misaligned frame
+        data = data[:len(data) - len(data) % 2]
+        if not data:
+            return
+
+        frame = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+        rms = float(np.sqrt(np.mean(frame ** 2)))
+
+        if rms >= STREAM_VAD_THRESHOLD:
+            if not self._in_speech:
+                # Speech onset: start buffering, but only barge in once it lasts
+                self._in_speech = True
+                if self._last_frame is not None:
+                    # Keep one frame of pre-roll so the first phoneme isn't clipped
+                    self._speech.append(self._last_frame)
+            self._silence_samples = 0
+        elif self._in_speech:
+            self._silence_samples += frame.size
+
+        self._last_frame = frame
+        if not self._in_speech:
+            return
+
+        self._speech.append(frame)
+        self._speech_samples += frame.size
+
+        # Barge in on whatever the agent is saying once this is real speech,
+        # not a click, cough or echo leak
+        voiced_samples = self._speech_samples - self._silence_samples
+        if not self._barged_in and voiced_samples >= self._min_speech:
+            self._barged_in = True
+            await self.cancel_turn(notify=True)
+
+        if self._silence_samples >= self._silence_limit:
+            await self._end_utterance()
+
+    async def _end_utterance(self):
+        speech = self._speech
+        voiced_samples = self._speech_samples - self._silence_samples
+
+        self._speech = []
+        self._last_frame = None
+        self._in_speech = False
+        self._barged_in = False
+        self._speech_samples = 0
+        self._silence_samples = 0
+
+        if not speech or voiced_samples < self._min_speech:
+            return
+
+        await self._start_turn(self._run_voice_turn(np.concatenate(speech)))
+
+    # --- Turn pipeline ---
+
+    async def _start_turn(self, coro):
+        await self.cancel_turn(notify=True)
+        self._turn = asyncio.create_task(self._guard(coro))
+
+    async def _guard(self, coro):
+        # Turn failures (including a client that vanished mid-send) must not kill the session
+        try:
+            await coro
+        except Exception as e:
+            logger.error(f"Voice turn failed for session {self.session_id}: {e}")
+
+    async def _run_voice_turn(self, audio: np.ndarray):
+        try:
+            text = (await self._run_model(stt_lock, transcribe_array, audio) or "").strip()
+        except Exception as e:
+            logger.error(f"Transcription failed: {e}")
+            await self._send_json({"type": "error", "detail": "Transcription failed."})
+            return
+
+        if not text:
+            return
+
+        await self._send_json({"type": "transcript", "text": text})
+        await self._respond(text)
+
+    async def _respond(self, text: str):
+        """Stream the LLM reply into the TTS queue and record the turn, even if it is interrupted."""
+        past_context = self.context
+        logger.agent_output(f"User Input: {text}")
+
+        queue = asyncio.Queue()
+        spoken = []
+        speaker = asyncio.create_task(self._speak(queue, spoken))
+        raw_content = ""
+        queued_chars = 0
+
+        try:
+            try:
+                async for chunk in llm.astream(build_prompt_messages(text, past_context)):
+                    raw_content += chunk.content
+                    pending = visible_text(raw_content)[queued_chars:]
+
+                    # Queue every complete sentence, keep the tail until it ends
+                    boundaries = list(SENTENCE_END.finditer(pending))
+                    if boundaries:
+                        cut = boundaries[-1].end()
+                        for seg in split_segments(pending[:cut]):
+                            queue.put_nowait(seg)
+                        queued_chars += cut
+            except Exception as e:
+                logger.error(f"LLM stream failed: {e}")
+                raw_content = ERROR_RESPONSE
+                queued_chars = 0
+
+            for seg in split_segments(visible_text(raw_content)[queued_chars:]):
+                queue.put_nowait(seg)
+            queue.put_nowait(None)
+            await speaker
+        except asyncio.CancelledError:
+            # Keep the question and the sentences whose playback had started
+            now = self._playback_time()
+            heard = " ".join(seg for seg, starts_at in spoken if starts_at <= now)
+            logger.agent_output(f"Agent Response (interrupted): {heard}")
+            self._record_turn(text, f"{heard} [interrupted]".strip(), "", past_context)
+            raise
+        finally:
+            if not speaker.done():
+                speaker.cancel()
+
+        content, agent_thinking = clean_response(raw_content)
+        logger.agent_output(f"Agent Response: {content}")
+        if raw_content != ERROR_RESPONSE:
+            self._record_turn(text, content, agent_thinking, past_context)
+        await self._send_json({"type": "turn_end", "text": content})
+
+    def _record_turn(self, text: str, content: str, agent_thinking: str, past_context: str):
+        # Same format as get_cumulative_context so the next turn skips the database
+        new_entry = f"Human: {text}\nAI: {content}\n"
+        self.context = f"{past_context}\n{new_entry}" if past_context else new_entry
+
+        # Saved without the archiver's summary: that would compete with the next
+        # turn for the LLM, and context here comes from memory, not the summary
+        self._run_in_background(self._save_turn(
+            session_id=self.session_id,
+            user_query=text,
+            agent_answer=content,
+            agent_thinking=agent_thinking,
+            query_answer_context="",
+            cumilative_context=past_context,
+        ))
+
+    async def _speak(self, queue: asyncio.Queue, spoken: list):
+        while True:
+            seg = await queue.get()
+            if seg is None:
+                break
+
+            # Enforce UPPERCASE, as the refiner does for the HTTP endpoints
+            seg = seg.upper()
+            try:
+                audio = await self._run_model(tts_lock, generate_segment_audio, seg)
+            except Exception as e:
+                logger.error(f"TTS failed for segment '{seg}': {e}")
+                continue
+
+            pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+            # The client plays segments back to back, starting as soon as each arrives
+            starts_at = max(self._playback_time(), self._playback_end)
+            self._playback_end = starts_at + len(audio) / tts.sr
+            spoken.append((seg, starts_at))
+            # A barge-in must not split the header from its PCM frame
+            await asyncio.shield(self._send_audio(seg, pcm))
+
+    async def _run_model(self, lock, fn, *args):
+        """
+        Run a blocking model call in a worker thread, one call per model at a time.
+
+        Cancelling the turn can't stop a call that is already running, but a call
+        still waiting for the model when its turn is cancelled is skipped, so an
+        abandoned turn never delays the next one by more than a single call.
+        """
+        cancelled = threading.Event()
+
+        def call():
+            with lock:
+                if cancelled.is_set():
+                    return None
+                return fn(*args)
+
+        try:
+            return await asyncio.to_thread(call)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def _save_turn(self, **interaction):
+        # Serialize saves so rows land in turn order
+        async with self._save_lock:
+            try:
+                await asyncio.to_thread(save_interaction, **interaction)
+            except Exception as e:
+                logger.error(f"Failed to save streamed turn: {e}")
+
+    def _playback_time(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _run_in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    # --- Output ---
+
+    async def _send_json(self, payload: dict):
+        async with self._send_lock:
+            await self.websocket.send_json(payload)
+
+    async def _send_audio(self, text: str, pcm: bytes):
+        # Header and binary frame go out back to back under one lock
+        async with self._send_lock:
+            await self.websocket.send_json({"type": "audio", "text": text, "sample_rate": tts.sr})
+            await self.websocket.send_bytes(pcm)
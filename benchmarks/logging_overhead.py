@@ -0,0 +1,73 @@
+"""
+Measures the per-call cost of logging on the calling (request) thread.
+
+Compares the original synchronous handlers against the queue-based pipeline,
+for plain `logger.info` calls and for `logger.agent_output` calls carrying
+large agent responses. Log files are written to a temporary directory.
+
+Calls are issued back to back, so the listener thread competes with the
+caller for the GIL the whole time; bursty request logging sees less overhead.
+
+Usage:
+    python -m benchmarks.logging_overhead [--calls 20000]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from app.core.logging import setup_logger, get_logger, set_request_id, shutdown_logger
+
+CASES = [
+    ("info (short)", "info", "Segmented text into 4 chunks."),
+    ("agent_output (2 KB)", "agent_output", "AGENT RESPONSE. " * 128),
+    ("agent_output (32 KB)", "agent_output", "AGENT RESPONSE. " * 2048),
+]
+
+# (name, use_queue, json_format, agent_output_max_chars)
+# "before" matches the original setup: synchronous handlers, full agent outputs.
+MODES = [
+    ("before", False, False, 0),
+    ("sync, text", False, False, 2000),
+    ("queue, text", True, False, 2000),
+    ("queue, json", True, True, 2000),
+]
+
+def run_case(use_queue, json_format, max_chars, method, message, calls):
+    """Return microseconds per call as seen by the caller."""
+    with tempfile.TemporaryDirectory() as log_dir:
+        setup_logger(
+            log_dir=Path(log_dir),
+            use_queue=use_queue,
+            json_format=json_format,
+            agent_output_max_chars=max_chars,
+            console=False
+        )
+        set_request_id("bench")
+        log = getattr(get_logger("benchmark"), method)
+
+        start = time.perf_counter()
+        for _ in range(calls):
+            log(message)
+        elapsed = time.perf_counter() - start
+
+        # Drain the queue and close the log files before the directory is removed
+        shutdown_logger()
+    return elapsed / calls * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    header = f"{'case':<24}" + "".join(f"{mode[0]:>16}" for mode in MODES)
+    print(f"Per-call overhead on the calling thread (us), {args.calls} calls each")
+    print(header)
+    print("-" * len(header))
+    for label, method, message in CASES:
+        row = f"{label:<24}"
+        for _, use_queue, json_format, max_chars in MODES:
+            row += f"{run_case(use_queue, json_format, max_chars, method, message, args.calls):>16.2f}"
+        print(row)
+
+if __name__ == "__main__":
+    main()